@@ -5,10 +5,16 @@ Performs data cleanup and analysis on BLS employment and DataUSA population data
 
 import json
 import logging
+import math
 import os
 import boto3
+import numpy as np
 import pandas as pd
-from io import StringIO
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+from botocore.config import Config
+from io import BytesIO
 from datetime import datetime
 
 # Configure logging
@@ -20,24 +26,81 @@ BUCKET_NAME = os.environ.get('BUCKET_NAME', 'rearc-deepa-demo')
 BLS_DATA_KEY = os.environ.get('BLS_DATA_KEY', 'raw/pr/pr.data.0.Current')
 POPULATION_PREFIX = os.environ.get('POPULATION_PREFIX', 'raw/datausa/population/')
 
+# Shared S3 client, created once per Lambda container so warm invocations reuse
+# its connection pool
+S3_CLIENT = boto3.client(
+    's3',
+    region_name='eu-north-1',
+    config=Config(max_pool_connections=32, retries={'mode': 'adaptive'})
+)
+
+# BLS pr.data.* columns used by the report. The streaming CSV reader fixes the
+# schema from the first block, so the column types are pinned up front.
+BLS_COLUMN_TYPES = {
+    'series_id': pa.string(),
+    'year': pa.int64(),
+    'period': pa.string(),
+    'value': pa.float64()
+}
+
+# DataUSA population column types, applied once at load time. Population is
+# float so missing values survive as NaN instead of failing the cast.
+POP_DTYPES = {'Year': 'int32', 'Population': 'float64'}
+
+# Q3 report target
+Q3_TARGET_SERIES = 'PRS30006032'
+Q3_TARGET_PERIOD = 'Q01'
+
+
+def clean_string_columns(table):
+    """Trim whitespace and uppercase every string column of an Arrow table"""
+    for i, field in enumerate(table.schema):
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            column = pc.utf8_upper(pc.utf8_trim_whitespace(table.column(i)))
+            table = table.set_column(i, field.name, column)
+    return table
+
 
 def load_bls_data(s3_client):
     """Load and clean BLS employment data from S3"""
     logger.info(f"Loading BLS data from s3://{BUCKET_NAME}/{BLS_DATA_KEY}")
     
     obj = s3_client.get_object(Bucket=BUCKET_NAME, Key=BLS_DATA_KEY)
-    bls_data = pd.read_csv(StringIO(obj['Body'].read().decode('utf-8')), sep='\t')
     
-    # Clean column names
-    bls_data.columns = bls_data.columns.str.strip()
-    
-    # Drop footnote_codes 
-    if 'footnote_codes' in bls_data.columns:
-        bls_data = bls_data.drop(columns=['footnote_codes'])
+    # Read the header ourselves: its names are padded with whitespace, and the
+    # cleaned names are what the pinned column types are keyed on
+    body = obj['Body']
+    header = body.readline().decode('utf-8')
+    column_names = [name.strip() for name in header.rstrip('\r\n').split('\t')]
+    missing = [name for name in BLS_COLUMN_TYPES if name not in column_names]
+    if missing:
+        raise ValueError(f"BLS data is missing expected columns {missing}, header has {column_names}")
+    
+    # Stream the rest of the TSV through Arrow's incremental reader instead of
+    # buffering the whole object; footnote_codes and any other extra columns are
+    # dropped at parse time
+    read_options = pacsv.ReadOptions(block_size=8 << 20, column_names=column_names)
+    parse_options = pacsv.ParseOptions(delimiter='\t')
+    convert_options = pacsv.ConvertOptions(
+        column_types=BLS_COLUMN_TYPES,
+        include_columns=list(BLS_COLUMN_TYPES),
+        strings_can_be_null=True
+    )
+    reader = pacsv.open_csv(
+        pa.PythonFile(body, mode='r'),
+        read_options=read_options,
+        parse_options=parse_options,
+        convert_options=convert_options
+    )
+    table = reader.read_all()
     
     # Trim whitespace and uppercase all string columns
-    for col in bls_data.select_dtypes(include='object').columns:
-        bls_data[col] = bls_data[col].str.strip().str.upper()
+    table = clean_string_columns(table)
+    
+    bls_data = table.to_pandas(types_mapper=pd.ArrowDtype)
+    
+    # Low-cardinality keys become categoricals so groupby and filters work on codes
+    bls_data = bls_data.astype({'series_id': 'category', 'period': 'category'})
     
     # Remove Q05 records (invalid quarterly data)
     initial_count = len(bls_data)
@@ -68,19 +131,26 @@ def load_population_data(s3_client):
     logger.info(f"Loading latest population file: {pop_key}")
     
     obj = s3_client.get_object(Bucket=BUCKET_NAME, Key=pop_key)
-    pop_json = json.loads(obj['Body'].read().decode('utf-8'))
+    pop_json = json.loads(obj['Body'].read())
     
-    # Handle different JSON structures
+    # Handle different JSON structures, building the columnar table directly
     if 'data' in pop_json:
-        pop_data = pd.DataFrame(pop_json['data'])
+        pop_table = pa.Table.from_pylist(pop_json['data'])
     elif isinstance(pop_json, list):
-        pop_data = pd.DataFrame(pop_json)
+        pop_table = pa.Table.from_pylist(pop_json)
     else:
-        pop_data = pd.DataFrame([pop_json])
+        pop_table = pa.Table.from_pylist([pop_json])
+    
+    if pop_table.num_rows == 0:
+        logger.warning(f"No population records in {pop_key}")
+        return pd.DataFrame()
     
     # Trim whitespace and uppercase all string columns
-    for col in pop_data.select_dtypes(include='object').columns:
-        pop_data[col] = pop_data[col].str.strip().str.upper()
+    pop_data = clean_string_columns(pop_table).to_pandas(types_mapper=pd.ArrowDtype)
+    
+    # Cast the numeric columns once so Q1/Q3 work on native NumPy dtypes; rows
+    # without a Year can't be matched to anything and are dropped
+    pop_data = pop_data.dropna(subset=['Year']).astype(POP_DTYPES)
     
     logger.info(f"Loaded population data: {len(pop_data):,} rows, {len(pop_data.columns)} columns")
     return pop_data
@@ -94,44 +164,74 @@ def analyze_q1_population_stats(pop_data):
         logger.warning("Q1: No population data available")
         return None
     
-    # Filter for years 2013-2018
-    pop_filtered = pop_data[(pop_data['Year'] >= 2013) & (pop_data['Year'] <= 2018)].copy()
+    # Filter for years 2013-2018 on the underlying arrays
+    years = pop_data['Year'].to_numpy()
+    population = pop_data['Population'].to_numpy(dtype=np.float64)[(years >= 2013) & (years <= 2018)]
+    record_count = population.size
     
-    if len(pop_filtered) == 0:
+    if record_count == 0:
         logger.warning("Q1: No data for years 2013-2018")
         return "No Data"
     
-    mean_pop = pop_filtered['Population'].mean()
-    std_pop = pop_filtered['Population'].std()
+    # Mean and sample standard deviation (ddof=1, as pandas .std()) in NumPy,
+    # skipping missing populations like pandas does
+    values = population[~np.isnan(population)]
+    value_count = values.size
+    mean_pop = values.sum() / value_count if value_count > 0 else float('nan')
+    if value_count > 1:
+        deviations = values - mean_pop
+        std_pop = math.sqrt(np.dot(deviations, deviations) / (value_count - 1))
+    else:
+        std_pop = float('nan')
     
     result = {
         'analysis': 'Q1 - Population Statistics (2013-2018)',
         'mean_population': float(mean_pop),
         'std_dev_population': float(std_pop),
-        'record_count': len(pop_filtered),
+        'record_count': record_count,
         'years': '2013-2018'
     }
     
-    logger.info(f"Q1 Result: Mean={mean_pop:.0f}, StdDev={std_pop:.0f}, Records={len(pop_filtered)}")
+    logger.info(f"Q1 Result: Mean={mean_pop:.0f}, StdDev={std_pop:.0f}, Records={record_count}")
     return result
 
 
-def analyze_q2_best_years(bls_data):
-    """Q2: Find best year per BLS series (year with max sum of quarterly values)"""
+def best_year_positions(series_codes, years, sums):
+    """Return the position of the max-sum row for each series code
+    
+    Rows are ordered by (series code, sum descending, year ascending) in one
+    lexsort and the first row of each code is taken, so ties go to the earliest
+    year as with idxmax.
+    """
+    order = np.lexsort((years, -sums, series_codes))
+    _, first = np.unique(series_codes[order], return_index=True)
+    return order[first]
+
+
+def analyze_q2_best_years(bls_grouped):
+    """Q2: Find best year per BLS series (year with max sum of quarterly values)
+    
+    Takes the BLS data already grouped by ['series_id', 'year'].
+    """
     logger.info("Starting Q2 Analysis: Best Year per BLS Series")
     
-    if len(bls_data) == 0:
+    if bls_grouped.ngroups == 0:
         logger.warning("Q2: No BLS data available")
         return "No BLS data available"
     
     # Calculate yearly sums for each series
-    yearly_sums = bls_data.groupby(['series_id', 'year'])['value'].sum().reset_index()
+    yearly_sums = bls_grouped['value'].sum()
     
-    # Find best year per series (year with max value)
-    best_years = yearly_sums.loc[yearly_sums.groupby('series_id')['value'].idxmax()].sort_values('series_id').reset_index(drop=True)
+    # Find best year per series (year with max value) on the MultiIndex codes
+    best_pos = best_year_positions(
+        yearly_sums.index.codes[0],
+        yearly_sums.index.get_level_values('year').to_numpy(),
+        yearly_sums.to_numpy(dtype=np.float64)
+    )
+    best_years = yearly_sums.iloc[best_pos].reset_index()
     
     # Convert to dictionary format
-    best_years_dict = best_years.set_index('series_id')[['year', 'value']].to_dict('index')
+    best_years_dict = best_years.set_index('series_id').sort_index()[['year', 'value']].to_dict('index')
     
     result = {
         'analysis': 'Q2 - Best Year per BLS Series',
@@ -143,18 +243,20 @@ def analyze_q2_best_years(bls_data):
     return result
 
 
-def analyze_q3_series_with_population(bls_data, pop_data):
-    """Q3: Generate report for series PRS30006032 period Q01 with population data"""
+def analyze_q3_series_with_population(bls_data, pop_data, period_mask):
+    """Q3: Generate report for series PRS30006032 period Q01 with population data
+    
+    period_mask is the precomputed bls_data['period'] == Q3_TARGET_PERIOD mask.
+    The report rows are returned under 'data' as an Arrow table.
+    """
     logger.info("Starting Q3 Analysis: Series PRS30006032 Q01 + Population")
     
-    target_series = 'PRS30006032'
-    target_period = 'Q01'
+    target_series = Q3_TARGET_SERIES
+    target_period = Q3_TARGET_PERIOD
     
     # Filter BLS data for target series and period
-    series_q01 = bls_data[
-        (bls_data['series_id'].str.contains(target_series)) & 
-        (bls_data['period'] == target_period)
-    ].copy()
+    mask = (bls_data['series_id'] == target_series) & period_mask
+    series_q01 = bls_data.loc[mask, ['series_id', 'year', 'period', 'value']]
     
     if len(series_q01) == 0:
         logger.warning(f"Q3: No data found for series {target_series} period {target_period}")
@@ -165,24 +267,15 @@ def analyze_q3_series_with_population(bls_data, pop_data):
         result = {
             'analysis': f'Q3 - Series {target_series} {target_period} (BLS data only)',
             'record_count': len(series_q01),
-            'data': series_q01.to_dict('records')
+            'data': pa.Table.from_pandas(series_q01, preserve_index=False)
         }
         return result
     
-    # Merge with population data
-    series_q01['year'] = series_q01['year'].astype(int)
-    pop_data['Year'] = pop_data['Year'].astype(int)
-    
-    final_report = series_q01.merge(
-        pop_data[['Year', 'Population']], 
-        left_on='year', 
-        right_on='Year', 
-        how='left'
-    )[['series_id', 'year', 'period', 'value', 'Population']].sort_values('year')
-    
-    if len(final_report) == 0:
-        logger.warning("Q3: No matching data after merge with population")
-        return {"error": "No matching data after merge with population"}
+    # Attach population with a Year -> Population lookup; the table is a handful of rows
+    pop_map = dict(zip(pop_data['Year'], pop_data['Population']))
+    final_report = series_q01.assign(
+        Population=series_q01['year'].map(pop_map)
+    ).sort_values('year')
     
     year_range = f"{final_report['year'].min()}-{final_report['year'].max()}"
     result = {
@@ -191,13 +284,29 @@ def analyze_q3_series_with_population(bls_data, pop_data):
         'period': target_period,
         'record_count': len(final_report),
         'year_range': year_range,
-        'data': final_report.to_dict('records')
+        'data': pa.Table.from_pandas(final_report, preserve_index=False)
     }
     
-    logger.info(f"Q3 Result: {final_report.to_dict('records')}")
+    logger.info(f"Q3 Result: {len(final_report)} records, years {year_range}")
     return result
 
 
+def save_table_as_ndjson(s3_client, table, key):
+    """Write an Arrow table to S3 as newline-delimited JSON
+    
+    The table is rendered into a single in-memory buffer before uploading; the
+    Q3 report is one series (a row per year), so it is small enough to hold whole.
+    """
+    ndjson = b''.join(json.dumps(record).encode('utf-8') + b'\n' for record in table.to_pylist())
+    
+    s3_client.upload_fileobj(
+        BytesIO(ndjson),
+        BUCKET_NAME,
+        key,
+        ExtraArgs={'ContentType': 'application/x-ndjson'}
+    )
+
+
 def lambda_handler(event, context):
     """
     Lambda handler for Part 3 analytics
@@ -213,17 +322,22 @@ def lambda_handler(event, context):
         logger.info("Starting Rearc Data Quest Part 3 Analytics Lambda")
         logger.info(f"Event: {json.dumps(event)}")
         
-        # Initialize S3 client
-        s3_client = boto3.client('s3', region_name='eu-north-1')
-        
         # Load and clean data
-        bls_data = load_bls_data(s3_client)
-        pop_data = load_population_data(s3_client)
+        bls_data = load_bls_data(S3_CLIENT)
+        pop_data = load_population_data(S3_CLIENT)
+        
+        # Group and filter BLS once; Q2 and Q3 share these instead of re-scanning the frame
+        bls_grouped = bls_data.groupby(['series_id', 'year'], sort=False, observed=True)
+        q3_period_mask = bls_data['period'] == Q3_TARGET_PERIOD
         
         # Perform all analyses
         q1 = analyze_q1_population_stats(pop_data)
-        q2 = analyze_q2_best_years(bls_data)
-        q3 = analyze_q3_series_with_population(bls_data, pop_data)
+        q2 = analyze_q2_best_years(bls_grouped)
+        q3 = analyze_q3_series_with_population(bls_data, pop_data, q3_period_mask)
+        
+        # Q3 rows stay in Arrow and are stored as NDJSON next to the results,
+        # so the summary JSON and response body only carry counts and locations
+        q3_table = q3.pop('data', None) if isinstance(q3, dict) else None
         
         # Compile results
         results = {
@@ -238,24 +352,41 @@ def lambda_handler(event, context):
         
         logger.info("All analyses completed successfully, Results are logged")
         
-        # Save results to S3
+        # Save results to S3 - serialize once and return the same body
+        results_name = f"analytics/results/analysis_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        results_key = f"{results_name}.json"
+        q3_data_key = f"{results_name}_q3.ndjson"
+        if q3_table is not None:
+            try:
+                save_table_as_ndjson(S3_CLIENT, q3_table, q3_data_key)
+                q3['data_location'] = f"s3://{BUCKET_NAME}/{q3_data_key}"
+                logger.info(f"Q3 data saved to S3: s3://{BUCKET_NAME}/{q3_data_key}")
+            except Exception as e:
+                # Fall back to returning the rows inline so they aren't lost
+                logger.error(f"Failed to save Q3 data to S3: {str(e)}")
+                q3['data'] = q3_table.to_pylist()
+                q3['data_save_error'] = str(e)
+        
+        results['s3_location'] = f"s3://{BUCKET_NAME}/{results_key}"
+        body = json.dumps(results)
         try:
-            results_key = f"analytics/results/analysis_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            s3_client.put_object(
-                Bucket=BUCKET_NAME,
-                Key=results_key,
-                Body=json.dumps(results, indent=2),
-                ContentType='application/json'
+            # upload_fileobj switches to a chunked multipart upload for large reports
+            S3_CLIENT.upload_fileobj(
+                BytesIO(body.encode('utf-8')),
+                BUCKET_NAME,
+                results_key,
+                ExtraArgs={'ContentType': 'application/json'}
             )
             logger.info(f"Results saved to S3: s3://{BUCKET_NAME}/{results_key}")
-            results['s3_location'] = f"s3://{BUCKET_NAME}/{results_key}"
         except Exception as e:
             logger.error(f"Failed to save results to S3: {str(e)}")
+            del results['s3_location']
             results['s3_save_error'] = str(e)
+            body = json.dumps(results)
 
         return {
             'statusCode': 200,
-            'body': json.dumps(results, indent=2),
+            'body': body,
             'headers': {
                 'Content-Type': 'application/json'
             }
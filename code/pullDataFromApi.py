@@ -9,12 +9,14 @@ import json
 import logging
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from urllib.parse import urljoin
 from urllib.request import Request, urlopen
 
 import boto3
-import botocore
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 
 # Configure logging
 logger = logging.getLogger()
@@ -24,12 +26,36 @@ logger.setLevel(logging.INFO)
 DEFAULT_BLS_URL = "https://download.bls.gov/pub/time.series/pr/"
 DEFAULT_DATAUSA_URL = "https://honolulu-api.datausa.io/tesseract/data.jsonrecords?cube=acs_yg_total_population_1&drilldowns=Year%2CNation&locale=en&measures=Population"
 DEFAULT_TIMEOUT = 60
+# The function runs with 128 MB; each upload worker buffers one multipart chunk
+# (8 MB) of its non-seekable HTTP stream, so keep the worker count small
+DEFAULT_MAX_WORKERS = 4
+S3_DELETE_BATCH_SIZE = 1000  # DeleteObjects limit per request
+
+# Transfers run on the calling worker thread instead of starting their own
+# s3transfer thread pool, so concurrency (and memory) is bounded by the workers
+STREAM_TRANSFER_CONFIG = TransferConfig(use_threads=False)
+
+# Shared S3 client, created once per Lambda container so warm invocations reuse
+# its connection pool. boto3 clients are thread-safe; each worker holds at most
+# one connection at a time, so the pool matches the worker count.
+S3_CLIENT = boto3.client(
+    "s3",
+    config=Config(max_pool_connections=DEFAULT_MAX_WORKERS, retries={"mode": "adaptive"}),
+)
 
 
 #==============================================================================
 # PART 1: BLS DATA SYNC
 #==============================================================================
 
+# Apache-style directory listing row: date, time, size, link. Compiled once per
+# Lambda container so warm invocations reuse it.
+BLS_LISTING_PATTERN = re.compile(
+    r'(\d{1,2}/\d{1,2}/\d{4})\s+(\d{1,2}:\d{2}\s+(?:AM|PM))\s+\d+\s+<a\s+href="([^"]+)">([^<]+)</a>',
+    re.IGNORECASE
+)
+
+
 def discover_bls_files(base_url: str, user_agent: str, timeout: int = DEFAULT_TIMEOUT) -> list[tuple[str, str, object]]:
     """Returns list of (filename, url, timestamp) from BLS directory listing."""
     logger.info(f"[Part 1] Fetching BLS directory listing from {base_url}")
@@ -40,13 +66,8 @@ def discover_bls_files(base_url: str, user_agent: str, timeout: int = DEFAULT_TI
         html = resp.read().decode("utf-8", errors="replace")
     
     # Parse Apache-style directory listing
-    pattern = re.compile(
-        r'(\d{1,2}/\d{1,2}/\d{4})\s+(\d{1,2}:\d{2}\s+(?:AM|PM))\s+\d+\s+<a\s+href="([^"]+)">([^<]+)</a>',
-        re.IGNORECASE
-    )
-    
     files = []
-    for match in pattern.finditer(html):
+    for match in BLS_LISTING_PATTERN.finditer(html):
         date_str = match.group(1)
         time_str = match.group(2)
         href = match.group(3)
@@ -68,15 +89,14 @@ def discover_bls_files(base_url: str, user_agent: str, timeout: int = DEFAULT_TI
     return files
 
 
-def should_upload(remote_last_modified, s3_client, bucket: str, key: str) -> tuple[bool, str]:
-    """Check if file needs uploading by comparing timestamps."""
-    try:
-        s3_obj = s3_client.head_object(Bucket=bucket, Key=key)
-        s3_last_modified = s3_obj["LastModified"]
-    except botocore.exceptions.ClientError as exc:
-        if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
-            return True, "new"
-        raise
+def should_upload(remote_last_modified, existing: dict, key: str) -> tuple[bool, str]:
+    """Check if file needs uploading by comparing timestamps.
+    
+    `existing` maps S3 key -> LastModified, built from a single prefix listing.
+    """
+    s3_last_modified = existing.get(key)
+    if s3_last_modified is None:
+        return True, "new"
     
     if not remote_last_modified:
         return True, "no-timestamp"
@@ -103,14 +123,15 @@ def stream_to_s3(url: str, user_agent: str, s3_client, bucket: str, key: str, re
             bucket,
             key,
             ExtraArgs={"Metadata": metadata},
+            Config=STREAM_TRANSFER_CONFIG,
         )
         logger.info(f"[Part 1] ✓ Successfully uploaded {key}")
 
 
-def sync_bls_to_s3(bucket: str, user_agent: str, prefix: str, base_url: str, timeout: int = DEFAULT_TIMEOUT) -> dict:
+def sync_bls_to_s3(bucket: str, user_agent: str, prefix: str, base_url: str, timeout: int = DEFAULT_TIMEOUT, max_workers: int = DEFAULT_MAX_WORKERS) -> dict:
     """Part 1: Sync BLS employment data to S3."""
     prefix = prefix.rstrip("/") + "/" if prefix else ""
-    s3 = boto3.client("s3")
+    s3 = S3_CLIENT
     
     logger.info("="*60)
     logger.info("PART 1: BLS Data Sync")
@@ -122,15 +143,18 @@ def sync_bls_to_s3(bucket: str, user_agent: str, prefix: str, base_url: str, tim
     files = discover_bls_files(base_url, user_agent, timeout)
     logger.info(f"[Part 1] Found {len(files)} BLS files to process")
     
-    # Get current S3 files for deletion tracking
+    # List the prefix once: LastModified per key drives should_upload, and the
+    # direct files drive deletion tracking
     bls_file_names = {name for name, _, _ in files}
     try:
-        s3_response = s3.list_objects_v2(Bucket=bucket, Prefix=prefix)
+        existing = {}
         s3_files = []
-        if 'Contents' in s3_response:
-            for obj in s3_response['Contents']:
-                # Only track files in the direct prefix, not in deleted/ subfolder
+        paginator = s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
                 key = obj['Key']
+                existing[key] = obj['LastModified']
+                # Only track files in the direct prefix, not in deleted/ subfolder
                 if key.startswith(f"{prefix}deleted/"):
                     continue
                 filename = key.replace(prefix, "", 1)
@@ -138,31 +162,46 @@ def sync_bls_to_s3(bucket: str, user_agent: str, prefix: str, base_url: str, tim
                     s3_files.append((filename, key))
         logger.info(f"[Part 1] Found {len(s3_files)} existing files in S3")
     except Exception as exc:
-        logger.warning(f"[Part 1] Could not list S3 files for deletion tracking: {exc}")
+        logger.warning(f"[Part 1] Could not list S3 files, treating all as new: {exc}")
+        existing = {}
         s3_files = []
     
-    # Upload each file
-    uploaded = 0
-    skipped = 0
-    errors = 0
-    
-    for idx, (name, url, remote_timestamp) in enumerate(files, 1):
+    # Upload files concurrently - each one is an independent GET -> PUT
+    def process_file(idx, name, url, remote_timestamp):
         key = f"{prefix}{name}"
         logger.info(f"[Part 1] [{idx}/{len(files)}] Processing {name}")
         
         try:
-            needs_upload, reason = should_upload(remote_timestamp, s3, bucket, key)
+            needs_upload, reason = should_upload(remote_timestamp, existing, key)
             
             if needs_upload:
                 stream_to_s3(url, user_agent, s3, bucket, key, remote_timestamp, timeout)
+                return idx, "uploaded", name, reason
+            return idx, "skipped", name, reason
+        except Exception as exc:
+            logger.error(f"[Part 1]   ✗ ERROR: [{idx}/{len(files)}] {name} - {exc}", exc_info=True)
+            return idx, "error", name, str(exc)
+    
+    uploaded = 0
+    skipped = 0
+    errors = 0
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(process_file, idx, name, url, remote_timestamp)
+            for idx, (name, url, remote_timestamp) in enumerate(files, 1)
+        ]
+        # Counters are only touched here, on the calling thread
+        for future in as_completed(futures):
+            idx, status, name, reason = future.result()
+            if status == "uploaded":
                 uploaded += 1
-                logger.info(f"[Part 1]   ✓ UPLOADED: {name} ({reason})")
-            else:
+                logger.info(f"[Part 1]   ✓ UPLOADED: [{idx}/{len(files)}] {name} ({reason})")
+            elif status == "skipped":
                 skipped += 1
-                logger.info(f"[Part 1]   - SKIPPED: {name} ({reason})")
-        except Exception as exc:
-            errors += 1
-            logger.error(f"[Part 1]   ✗ ERROR: {name} - {exc}", exc_info=True)
+                logger.info(f"[Part 1]   - SKIPPED: [{idx}/{len(files)}] {name} ({reason})")
+            else:
+                errors += 1
     
     # Track deletions - move orphaned files to deleted/ folder
     moved = 0
@@ -172,24 +211,53 @@ def sync_bls_to_s3(bucket: str, user_agent: str, prefix: str, base_url: str, tim
         logger.info(f"[Part 1] Found {len(orphaned_files)} orphaned files (removed from BLS)")
         deleted_prefix = f"{prefix}deleted/"
         
-        for filename in orphaned_files:
-            old_key = f"{prefix}{filename}"
-            new_key = f"{deleted_prefix}{filename}"
-            
+        def copy_to_deleted(filename):
             try:
-                # Copy to deleted folder
                 s3.copy_object(
                     Bucket=bucket,
-                    CopySource={'Bucket': bucket, 'Key': old_key},
-                    Key=new_key
+                    CopySource={'Bucket': bucket, 'Key': f"{prefix}{filename}"},
+                    Key=f"{deleted_prefix}{filename}"
                 )
-                # Delete original
-                s3.delete_object(Bucket=bucket, Key=old_key)
-                moved += 1
-                logger.info(f"[Part 1]   ↔ MOVED: {filename} → deleted/")
+                return filename, True
             except Exception as exc:
-                errors += 1
                 logger.error(f"[Part 1]   ✗ ERROR moving {filename}: {exc}", exc_info=True)
+                return filename, False
+        
+        # Copy to deleted folder - copies can't be batched, so run them concurrently
+        copied = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for filename, ok in executor.map(copy_to_deleted, orphaned_files):
+                if ok:
+                    copied.append(filename)
+                else:
+                    errors += 1
+        
+        # Delete originals in batches of up to S3_DELETE_BATCH_SIZE keys per request
+        for start in range(0, len(copied), S3_DELETE_BATCH_SIZE):
+            batch = copied[start:start + S3_DELETE_BATCH_SIZE]
+            try:
+                response = s3.delete_objects(
+                    Bucket=bucket,
+                    Delete={
+                        'Objects': [{'Key': f"{prefix}{filename}"} for filename in batch],
+                        'Quiet': True
+                    }
+                )
+            except Exception as exc:
+                errors += len(batch)
+                logger.error(f"[Part 1]   ✗ ERROR deleting {len(batch)} moved files: {exc}", exc_info=True)
+                continue
+            
+            failed_keys = set()
+            for err in response.get('Errors', []):
+                failed_keys.add(err['Key'])
+                errors += 1
+                logger.error(f"[Part 1]   ✗ ERROR moving {err['Key']}: {err.get('Code')} {err.get('Message')}")
+            
+            for filename in batch:
+                if f"{prefix}{filename}" not in failed_keys:
+                    moved += 1
+                    logger.info(f"[Part 1]   ↔ MOVED: {filename} → deleted/")
     
     # Summary
     logger.info("="*60)
@@ -227,7 +295,7 @@ def fetch_population_data(api_url: str, user_agent: str, timeout: int = DEFAULT_
     req = Request(api_url, headers=headers, method="GET")
     
     with urlopen(req, timeout=timeout) as response:
-        data = json.loads(response.read().decode('utf-8'))
+        data = json.loads(response.read())
         logger.info(f"[Part 2] Successfully fetched data: {len(data.get('data', []))} records")
         return data
 
@@ -237,7 +305,7 @@ def save_population_to_s3(bucket: str, prefix: str, data: dict, api_url: str) ->
     
     Note: S3 event notification will automatically trigger analytics Lambda.
     """
-    s3 = boto3.client("s3")
+    s3 = S3_CLIENT
     
     # Create timestamped key
     timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")